@@ -1,5 +1,6 @@
 import os.path
 import json
+import time
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -16,6 +17,12 @@ SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly',\
                     'https://www.googleapis.com/auth/drive.metadata.readonly',\
                     'https://www.googleapis.com/auth/calendar.events']
 
+#calendar API errors that go away when the request is sent again later.  403 is also used for
+#permanent errors (e.g. forbidden), so it is only retried for the rate limit reasons
+#https://developers.google.com/calendar/api/guides/errors
+RETRY_STATUS_CODES = (429, 500, 503)
+RETRY_403_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
 #this module contains functions that are used by various google api services, including:
 #Sheets, Docs, Drive, Calendar
 
@@ -272,6 +279,80 @@ def add_event_to_gcal(event, cal_service, cal_id):
     event_obj = cal_service.events().insert(calendarId=cal_id, body=event, supportsAttachments=True).execute()
     print('Event created: %s' % (event_obj.get('htmlLink')))
 
+def is_retryable_gcal_error(err):
+    """
+    Input:
+    err : Exception
+    Output:
+    retryable : bool
+    Checks if a failed calendar request should be sent again, which is the case for rate
+    limits and server errors.  A 403 is only retried when the reason of the error is one of
+    RETRY_403_REASONS
+    """
+    if not isinstance(err, HttpError):
+        return False
+    if err.resp.status in RETRY_STATUS_CODES:
+        return True
+    if err.resp.status != 403:
+        return False
+    try:
+        reasons = [error['reason'] for error in json.loads(err.content.decode('utf-8'))['error']['errors']]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return any(reason in RETRY_403_REASONS for reason in reasons)
+
+def import_events_to_gcal_batch(events, cal_service, cal_id, batch_size=50, max_retries=5):
+    """
+    Input:
+    events : iterable of dict (json)
+    cal_service: obj
+    cal_id : str
+    batch_size : int
+    max_retries : int
+    Output:
+    None
+    Bulk version of add_event_to_gcal(), the events are sent to the calendar with cal_id in
+    batched requests of batch_size (1 to 50) events each instead of one request per event.
+    Every event needs an iCalUID, the import method updates the event with the same iCalUID
+    if it is already in the calendar instead of adding a copy.  Events rejected because of rate
+    limits or server errors are sent again up to max_retries times, waiting longer after every
+    try.  Once all batches were sent, the first error that can not be retried is raised, or
+    the first rate limit or server error if the events still fail after max_retries
+    """
+    #https://developers.google.com/calendar/api/guides/batch
+    #https://developers.google.com/calendar/api/v3/reference/events/import
+    if batch_size < 1 or batch_size > 50:
+        raise ValueError("batch_size must be between 1 and 50, got {}".format(batch_size))
+    pending = list(events)
+    for attempt in range(max_retries + 1):
+        errors = {}
+
+        def collect_result(request_id, event_obj, exception):
+            if exception is not None:
+                errors[int(request_id)] = exception
+            else:
+                print('Event imported: %s' % (event_obj.get('htmlLink')))
+
+        for start in range(0, len(pending), batch_size):
+            batch = cal_service.new_batch_http_request(callback=collect_result)
+            for ix in range(start, min(start + batch_size, len(pending))):
+                request = cal_service.events().import_(calendarId=cal_id, body=pending[ix], supportsAttachments=True)
+                batch.add(request, request_id=str(ix))
+            batch.execute()
+        if not errors:
+            return
+        retry = sorted(ix for ix, err in errors.items() if is_retryable_gcal_error(err))
+        failed = sorted(ix for ix in errors if ix not in retry)
+        if failed:
+            print("{} events could not be imported".format(len(failed)))
+            raise errors[failed[0]]
+        if attempt == max_retries:
+            print("{} events still hit rate limits or server errors after {} retries".format(len(retry), max_retries))
+            raise errors[retry[0]]
+        print("{} events hit rate limits or server errors, retrying in {} seconds".format(len(retry), 2 ** attempt))
+        time.sleep(2 ** attempt)
+        pending = [pending[ix] for ix in retry]
+
 def set_gcal_event_time_str(date_str):
     """
     Input:
@@ -288,7 +369,7 @@ def set_gcal_event_time_str(date_str):
     time_lst =[start, stop]
     return time_lst
 
-def create_gcal_event_from_template(summary, date, file_id, drive_service, description):
+def create_gcal_event_from_template(summary, date, file_id, drive_service, description, drive_files=None):
     """
     Input:
     summary : str
@@ -296,13 +377,21 @@ def create_gcal_event_from_template(summary, date, file_id, drive_service, descr
     file_id : str
     drive_service : obj
     description : str
+    drive_files : dict
     Output :
     event : dict (json)
     Takes in event summary (name of the event), the date when it should be scheduled,
     description and drive service, as well as the file id of the attachment.  These necessary
-    parameters can be obtained through the MainEvent and EventTask classes
-    """
-    file = get_gdrive_file(file_id, drive_service)
+    parameters can be obtained through the MainEvent and EventTask classes.  If drive_files
+    is given, the attachment is looked up there by file_id first and added to it after it
+    is read from the google drive
+    """
+    if drive_files is None:
+        file = get_gdrive_file(file_id, drive_service)
+    else:
+        if file_id not in drive_files:
+            drive_files[file_id] = get_gdrive_file(file_id, drive_service)
+        file = drive_files[file_id]
     date_list = set_gcal_event_time_str(date)
     #Additional discussion of the format and including attachments is discussed here:
     #https://developers.google.com/calendar/api/guides/create-events
@@ -0,0 +1,488 @@
+import os
+import re
+import uuid
+import datetime
+import tempfile
+import zoneinfo
+
+#this module writes the event payloads built by gsuite.create_gcal_event_from_template into
+#iCalendar (.ics) files and reads them back.  The whole feed is written in one pass instead of
+#adding the events to the google calendar one request at a time
+#the format is described here: https://datatracker.ietf.org/doc/html/rfc5545
+
+PRODID = '-//subtask-scheduler//ics export//EN'
+UID_DOMAIN = 'subtask-scheduler'
+#namespace for the uuid5 UIDs, changing it changes the UID of every exported event
+UID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, UID_DOMAIN)
+#lines longer than 75 octets must be folded, see section 3.1 of rfc5545
+MAX_LINE_OCTETS = 75
+#permissions of a new feed file, the temporary file it is written to is only readable by its owner
+FEED_FILE_MODE = 0o644
+#time zone given to floating date-times (no TZID and no Z) read from an .ics file
+DEFAULT_TIMEZONE = 'America/New_York'
+#DURATION values such as P1D, PT8H or P1DT2H30M, see section 3.3.6 of rfc5545
+DURATION_PATTERN = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+#payload times without an offset in one of these time zones are written with a TZID, the
+#definitions below let calendar clients resolve it.  Times in other time zones are written in
+#UTC.  gsuite.create_gcal_event_from_template only uses America/New_York
+VTIMEZONES = {
+    'America/New_York': [
+        'BEGIN:VTIMEZONE',
+        'TZID:America/New_York',
+        'BEGIN:DAYLIGHT',
+        'TZOFFSETFROM:-0500',
+        'TZOFFSETTO:-0400',
+        'TZNAME:EDT',
+        'DTSTART:19700308T020000',
+        'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU',
+        'END:DAYLIGHT',
+        'BEGIN:STANDARD',
+        'TZOFFSETFROM:-0400',
+        'TZOFFSETTO:-0500',
+        'TZNAME:EST',
+        'DTSTART:19701101T020000',
+        'RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU',
+        'END:STANDARD',
+        'END:VTIMEZONE'
+    ]
+}
+
+#export
+
+def create_ics_uid(event_key):
+    """
+    Input:
+    event_key : str
+    Output:
+    uid : str
+    Creates the UID of the calendar event from the dictionary key used for the event in
+    main.py (event_id for Main Events, "name  |  parent_id" for Event Tasks).  The same key
+    always produces the same UID, so calendar clients update the events of a re-exported feed
+    instead of duplicating them
+    """
+    uid = str(uuid.uuid5(UID_NAMESPACE, event_key)) + '@' + UID_DOMAIN
+    return uid
+
+def escape_ics_text(text):
+    """
+    Input:
+    text : str
+    Output:
+    text : str
+    Escapes backslashes, semicolons, commas and new lines in a TEXT property value
+    """
+    text = text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+    text = text.replace('\r\n', '\\n').replace('\n', '\\n')
+    return text
+
+def quote_ics_param(value):
+    """
+    Input:
+    value : str
+    Output:
+    value : str
+    Property parameter values that contain colons, semicolons or commas must be put in double
+    quotes.  Double quotes themselves are not allowed in parameter values and are dropped
+    """
+    value = value.replace('"', '')
+    if any(char in value for char in ':;,'):
+        value = '"' + value + '"'
+    return value
+
+def fold_ics_line(line):
+    """
+    Input:
+    line : str
+    Output:
+    folded : str
+    Splits a content line into chunks of at most 75 octets, joined by CRLF followed by a
+    space.  The split never falls inside of a multi-byte utf-8 character
+    """
+    chunks = []
+    current = ''
+    current_len = 0
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        char_len = len(char.encode('utf-8'))
+        if current_len + char_len > limit:
+            chunks.append(current)
+            current = ''
+            current_len = 0
+            #continuation lines start with a space, which counts towards the 75 octets
+            limit = MAX_LINE_OCTETS - 1
+        current += char
+        current_len += char_len
+    chunks.append(current)
+    return '\r\n '.join(chunks)
+
+def convert_gcal_time_to_ics(time_dict):
+    """
+    Input:
+    time_dict : dict
+    Output:
+    prop_params : str
+    prop_value : str
+    tzid : str or None
+    Converts the start or end of the gcal event payload into the parameters and the value of
+    DTSTART/DTEND.  A dateTime with an offset, like 2023-06-01T09:00:00-04:00, is written in UTC
+    so the event stays at the same moment the calendar API would schedule it.  A dateTime
+    without an offset is local time in timeZone.  It is written with a TZID, which is also
+    returned, if VTIMEZONES has a definition for timeZone and in UTC otherwise.  All-day
+    events (date instead of dateTime) are written as VALUE=DATE
+    """
+    if 'date' in time_dict:
+        return ';VALUE=DATE', time_dict['date'].replace('-', ''), None
+    #fromisoformat() only understands the Z suffix from python 3.11
+    date_time = datetime.datetime.fromisoformat(time_dict['dateTime'].replace('Z', '+00:00'))
+    tzid = time_dict.get('timeZone', DEFAULT_TIMEZONE)
+    if date_time.tzinfo is None:
+        if tzid in VTIMEZONES:
+            return ';TZID=' + quote_ics_param(tzid), date_time.strftime('%Y%m%dT%H%M%S'), tzid
+        try:
+            date_time = date_time.replace(tzinfo=zoneinfo.ZoneInfo(tzid))
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValueError("The time zone {} of {} is unknown".format(tzid, time_dict['dateTime']))
+    utc_time = date_time.astimezone(datetime.timezone.utc)
+    return '', utc_time.strftime('%Y%m%dT%H%M%SZ'), None
+
+def create_ics_event_lines(event_key, cal_event, dtstamp):
+    """
+    Input:
+    event_key : str
+    cal_event : dict (json)
+    dtstamp : str
+    Output:
+    lines : list of str
+    tzids : set of str
+    Creates the unfolded content lines of a VEVENT from the event payload built by
+    gsuite.create_gcal_event_from_template.  event_key is the dictionary key of the event in
+    main.py and is used to create the UID.  Also returns the TZIDs used by the event, which
+    need a VTIMEZONE in the feed
+    """
+    start_params, start_value, start_tzid = convert_gcal_time_to_ics(cal_event['start'])
+    end_params, end_value, end_tzid = convert_gcal_time_to_ics(cal_event['end'])
+    lines = ['BEGIN:VEVENT',
+             'UID:' + create_ics_uid(event_key),
+             'DTSTAMP:' + dtstamp,
+             'DTSTART' + start_params + ':' + start_value,
+             'DTEND' + end_params + ':' + end_value,
+             'SUMMARY:' + escape_ics_text(cal_event['summary'])]
+    if cal_event.get('description'):
+        lines.append('DESCRIPTION:' + escape_ics_text(cal_event['description']))
+    # gcal recurrence entries are already ics content lines, e.g. RRULE:FREQ=DAILY;COUNT=1
+    lines.extend(cal_event.get('recurrence', []))
+    for attachment in cal_event.get('attachments', []):
+        attach_params = ''
+        if attachment.get('mimeType'):
+            attach_params += ';FMTTYPE=' + quote_ics_param(attachment['mimeType'])
+        if attachment.get('title'):
+            attach_params += ';X-TITLE=' + quote_ics_param(attachment['title'])
+        lines.append('ATTACH' + attach_params + ':' + attachment['fileUrl'])
+    lines.append('END:VEVENT')
+    tzids = {tzid for tzid in (start_tzid, end_tzid) if tzid is not None}
+    return lines, tzids
+
+def write_events_to_ics(events, file_path):
+    """
+    Input:
+    events : iterable of (str, dict) tuples
+    file_path : str
+    Output:
+    count : int
+    Writes the events into a single .ics file in one pass.  Each item of events is the
+    dictionary key of the event from main.py and the event payload built by
+    gsuite.create_gcal_event_from_template.  events can be a generator, every VEVENT is written
+    as soon as it is received so the whole feed never needs to be held in memory.
+    The feed is written to a temporary file next to file_path which replaces file_path only
+    once it is complete, so a failure while creating the payloads keeps the previous feed.
+    Returns the number of events written
+    """
+    dtstamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    count = 0
+    timezones_used = set()
+    #a unique temporary file, so runs that overlap do not write into the same file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                    prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        #rfc5545 requires CRLF line endings, newline='' stops python from translating them
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as ics_file:
+            ics_file.write('BEGIN:VCALENDAR\r\n')
+            ics_file.write('VERSION:2.0\r\n')
+            ics_file.write(fold_ics_line('PRODID:' + PRODID) + '\r\n')
+            ics_file.write('CALSCALE:GREGORIAN\r\n')
+            for event_key, cal_event in events:
+                lines, tzids = create_ics_event_lines(event_key, cal_event, dtstamp)
+                #the time zone component is written once, before the first event that uses it
+                for tzid in sorted(tzids - timezones_used):
+                    ics_file.write('\r\n'.join(VTIMEZONES[tzid]) + '\r\n')
+                timezones_used.update(tzids)
+                for line in lines:
+                    ics_file.write(fold_ics_line(line) + '\r\n')
+                count += 1
+            ics_file.write('END:VCALENDAR\r\n')
+        os.chmod(tmp_path, FEED_FILE_MODE)
+        os.replace(tmp_path, file_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print("{} events were written to {}".format(count, file_path))
+    return count
+
+def create_ics_file_name(cal_id):
+    """
+    Input:
+    cal_id : str
+    Output:
+    file_name : str
+    Creates the name of the .ics file of a calendar from its calendar id, replacing the
+    characters that are not letters, digits, dots, dashes or underscores with underscores
+    """
+    file_name = ''.join(char if char.isalnum() or char in '.-_' else '_' for char in cal_id)
+    return file_name + '.ics'
+
+def write_calendars_to_ics(calendars, out_dir):
+    """
+    Input:
+    calendars : dict
+    out_dir : str
+    Output:
+    file_paths : dict
+    Writes one .ics file per calendar.  The keys of calendars are the calendar ids and the
+    values are the (event key, event payload) iterables accepted by write_events_to_ics().
+    Returns a dictionary from the calendar id to the path of its .ics file
+    """
+    file_paths = {}
+    for cal_id, events in calendars.items():
+        file_path = os.path.join(out_dir, create_ics_file_name(cal_id))
+        write_events_to_ics(events, file_path)
+        file_paths[cal_id] = file_path
+    return file_paths
+
+#import
+
+def unfold_ics_lines(ics_file):
+    """
+    Input:
+    ics_file : file obj
+    Output:
+    line : str (generator)
+    Yields the unfolded content lines of an open .ics file, joining the continuation lines
+    (lines starting with a space or a tab) to the line before them
+    """
+    current = None
+    for raw_line in ics_file:
+        raw_line = raw_line.rstrip('\r\n')
+        if raw_line[:1] in (' ', '\t') and current is not None:
+            current += raw_line[1:]
+            continue
+        if current:
+            yield current
+        current = raw_line
+    if current:
+        yield current
+
+def split_ics_property(line):
+    """
+    Input:
+    line : str
+    Output:
+    name : str
+    params : dict
+    value : str
+    Splits an unfolded content line into the property name, its parameters and its value.
+    Colons and semicolons inside of double quoted parameter values are not treated as separators
+    """
+    parts = []
+    current = ''
+    in_quotes = False
+    for ix, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char in ';:' and not in_quotes:
+            parts.append(current)
+            current = ''
+            if char == ':':
+                value = line[ix + 1:]
+                break
+            continue
+        current += char
+    else:
+        #no value separator, the line is not a valid property
+        return line.upper(), {}, ''
+    name = parts[0].upper()
+    params = {}
+    for param in parts[1:]:
+        param_name, _, param_value = param.partition('=')
+        params[param_name.upper()] = param_value.strip('"')
+    return name, params, value
+
+def unescape_ics_text(text):
+    """
+    Input:
+    text : str
+    Output:
+    text : str
+    Reverses escape_ics_text()
+    """
+    result = ''
+    escaped = False
+    for char in text:
+        if escaped:
+            result += '\n' if char in 'nN' else char
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        else:
+            result += char
+    return result
+
+def parse_ics_time(params, value):
+    """
+    Input:
+    params : dict
+    value : str
+    Output:
+    time_value : datetime.date or datetime.datetime
+    tzid : str or None
+    Parses the value of DTSTART/DTEND.  VALUE=DATE values become a date, UTC values (ending
+    in Z) an aware datetime and all other values a naive datetime in the time zone tzid
+    """
+    if params.get('VALUE', '').upper() == 'DATE' or 'T' not in value:
+        return datetime.datetime.strptime(value[:8], '%Y%m%d').date(), None
+    time_value = datetime.datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    if value.upper().endswith('Z'):
+        return time_value.replace(tzinfo=datetime.timezone.utc), None
+    return time_value, params.get('TZID', DEFAULT_TIMEZONE)
+
+def parse_ics_duration(value):
+    """
+    Input:
+    value : str
+    Output:
+    duration : timedelta
+    Parses a DURATION value such as P1D, PT8H or -P1W, raises ValueError for anything else
+    """
+    match = DURATION_PATTERN.match(value.strip().upper())
+    if not match or not any(match.groups()[1:]):
+        raise ValueError("DURATION value {} is not supported".format(value))
+    weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups()[1:])
+    duration = datetime.timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+    if match.group(1) == '-':
+        duration = -duration
+    return duration
+
+def convert_ics_time_to_gcal(time_value, tzid):
+    """
+    Input:
+    time_value : datetime.date or datetime.datetime
+    tzid : str or None
+    Output:
+    time_dict : dict
+    Converts a value returned by parse_ics_time() into the start or end of a gcal event payload.
+    Dates become all-day {'date': ...} values.  Local date-times are written without an offset,
+    which the calendar API accepts when timeZone is given, UTC date-times keep their Z
+    """
+    if not isinstance(time_value, datetime.datetime):
+        return {'date': time_value.isoformat()}
+    if time_value.tzinfo is not None:
+        return {'dateTime': time_value.strftime('%Y-%m-%dT%H:%M:%SZ'), 'timeZone': 'UTC'}
+    return {'dateTime': time_value.isoformat(), 'timeZone': tzid}
+
+def set_gcal_event_times(cal_event, ics_times, uid):
+    """
+    Input:
+    cal_event : dict (json)
+    ics_times : dict
+    uid : str
+    Output:
+    cal_event : dict (json)
+    Sets start and end of the event payload from the DTSTART, DTEND and DURATION values
+    collected in ics_times.  Without DTEND the end is DTSTART plus DURATION, or as in section
+    3.6.1 of rfc5545 the end of the same day for all-day events and DTSTART for all other events
+    """
+    if 'DTSTART' not in ics_times:
+        raise ValueError("The event {} has no DTSTART".format(uid))
+    start_value, start_tzid = ics_times['DTSTART']
+    if 'DTEND' in ics_times:
+        end_value, end_tzid = ics_times['DTEND']
+    elif 'DURATION' in ics_times:
+        end_value, end_tzid = start_value + ics_times['DURATION'], start_tzid
+    elif isinstance(start_value, datetime.datetime):
+        end_value, end_tzid = start_value, start_tzid
+    else:
+        end_value, end_tzid = start_value + datetime.timedelta(days=1), start_tzid
+    cal_event['start'] = convert_ics_time_to_gcal(start_value, start_tzid)
+    cal_event['end'] = convert_ics_time_to_gcal(end_value, end_tzid)
+    return cal_event
+
+def read_events_from_ics(file_path):
+    """
+    Input:
+    file_path : str
+    Output:
+    events : dict
+    Reads all the events of an .ics file in one pass and returns a dictionary from the
+    (UID, RECURRENCE-ID) tuple of each event to an event payload in the same format as
+    gsuite.create_gcal_event_from_template.  RECURRENCE-ID is None for standalone events and
+    the master of a recurring series, and the raw RECURRENCE-ID value for an occurrence of the
+    series that was moved or changed.  The payload of such an occurrence also has the
+    originalStartTime of the calendar API.
+    The UID is also stored as iCalUID in the payload, so gsuite.import_events_to_gcal_batch()
+    updates the events that are already in the calendar instead of adding copies.  Events
+    without a UID are given one created from the file name and the position of the event
+    in the file.  Properties of components nested in an event (e.g. VALARM) are ignored
+    """
+    events = {}
+    components = []
+    cal_event = None
+    event_count = 0
+    with open(file_path, 'r', encoding='utf-8', newline='') as ics_file:
+        for line in unfold_ics_lines(ics_file):
+            name, params, value = split_ics_property(line)
+            if name == 'BEGIN':
+                components.append(value.upper())
+                if components[-1] == 'VEVENT':
+                    event_count += 1
+                    cal_event = {}
+                    ics_times = {}
+                    uid = None
+                    recurrence_id = None
+            elif name == 'END':
+                if not components or components[-1] != value.upper():
+                    raise ValueError("Unexpected END:{} in {}".format(value, file_path))
+                components.pop()
+                if value.upper() == 'VEVENT':
+                    if uid is None:
+                        uid = create_ics_uid(os.path.basename(file_path) + '#' + str(event_count))
+                    cal_event['iCalUID'] = uid
+                    events[(uid, recurrence_id)] = set_gcal_event_times(cal_event, ics_times, uid)
+                    cal_event = None
+            elif not components or components[-1] != 'VEVENT':
+                # skip the calendar and time zone properties, and those of alarms in the events
+                continue
+            elif name == 'UID':
+                uid = value
+            elif name == 'RECURRENCE-ID':
+                recurrence_id = value
+                cal_event['originalStartTime'] = convert_ics_time_to_gcal(*parse_ics_time(params, value))
+            elif name == 'SUMMARY':
+                cal_event['summary'] = unescape_ics_text(value)
+            elif name == 'DESCRIPTION':
+                cal_event['description'] = unescape_ics_text(value)
+            elif name in ('DTSTART', 'DTEND'):
+                ics_times[name] = parse_ics_time(params, value)
+            elif name == 'DURATION':
+                ics_times[name] = parse_ics_duration(value)
+            elif name in ('RRULE', 'EXRULE', 'RDATE', 'EXDATE'):
+                cal_event.setdefault('recurrence', []).append(line)
+            elif name == 'ATTACH':
+                attachment = {'fileUrl': value}
+                if 'FMTTYPE' in params:
+                    attachment['mimeType'] = params['FMTTYPE']
+                if 'X-TITLE' in params:
+                    attachment['title'] = params['X-TITLE']
+                cal_event.setdefault('attachments', []).append(attachment)
+    print("{} events were read from {}".format(len(events), file_path))
+    return events
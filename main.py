@@ -1,18 +1,25 @@
 from __future__ import print_function
 import os
+import itertools
 
 import gsuite
 import event
+import ics_feed
 from event import MainEvent
 from event import EventTask
 
-# set working dirctory, could be pulled out into config file
-os.chdir("C:/Users/Len/Documents/GitHub/goog_api_test/midterm")
+# working dirctory with credentials.json and token.json, could be pulled out into config file
+WORKING_DIR = "C:/Users/Len/Documents/GitHub/goog_api_test/midterm"
 
 
 # These global variables could be a part of a config file
 MAIN_EVENT_SHEET_ID = '1Fme8IXX5gmOqtrsJrMtIFO7YEVohBFgae49cJbDxSQ8'
 CALENDAR_ID ='ifkvu9ip2slqml42kiofdah138@group.calendar.google.com'
+# set EVENT_SINK to 'ics' to write all the events into ICS_FILE instead of adding them
+# to the calendar one by one
+EVENT_SINK = 'gcal'
+EVENT_SINKS = ('gcal', 'ics')
+ICS_FILE = 'scheduled_events.ics'
 
 #Functions that use both gsuite and event module stayed in main.py
 #-------------------------------------------------------------------------------------
@@ -61,22 +68,79 @@ def update_child_task_dict(task_dict, doc_dict, table_ix, parent_id):
         task_dict[tmp_key] = child_event_obj
     return task_dict
 
-def schedule_event(my_event, drive_service, cal_service):
+def create_event_payload(my_event, drive_service, drive_files=None):
+    """
+    Input:
+    my_event : MainEvent or TaskEvent obj
+    drive_service : obj
+    drive_files : dict
+    Output:
+    cal_event : dict (json)
+    Creates the json event for my_event from the template, it is used by both the calendar
+    and the ics sinks.  drive_files keeps the attachments already read from the google drive
+    by their file id, many tasks link to the same docs
+    """
+    cal_event = gsuite.create_gcal_event_from_template(my_event.name, my_event.get_event_date(), my_event.get_doc_id(), drive_service, my_event.get_description(), drive_files)
+    return cal_event
+
+def schedule_event(my_event, drive_service, cal_service, drive_files=None):
     """
     Input:
     my_event : MainEvent or TaskEvent obj
     drive_service : obj
     cal_service : obj
+    drive_files : dict
     Output :
     None
     This function creates a json event using a template and values proviced in the input, it
     adds the event to the calendar defined by the global constant at the top of hte file
     """
-    cal_event = gsuite.create_gcal_event_from_template(my_event.name, my_event.get_event_date(), my_event.get_doc_id(), drive_service, my_event.get_description())
+    cal_event = create_event_payload(my_event, drive_service, drive_files)
     gsuite.add_event_to_gcal(cal_event, cal_service, CALENDAR_ID)
     my_event.display()
 
+def create_event_payloads(events_dict, drive_service, drive_files=None):
+    """
+    Input:
+    events_dict : dict
+    drive_service : obj
+    drive_files : dict
+    Output:
+    (key, cal_event) : tuple of str and dict (generator)
+    Yields the dictionary key and the json event created from the template for each
+    MainEvent or TaskEvent in events_dict.  The key is used by the ics_feed module to create
+    a stable UID for the event
+    """
+    for key, my_event in events_dict.items():
+        yield key, create_event_payload(my_event, drive_service, drive_files)
+
+def import_ics_to_gcal(file_path, cal_service, cal_id):
+    """
+    Input:
+    file_path : str
+    cal_service : obj
+    cal_id : str
+    Output:
+    None
+    Reads all the events of an .ics file and imports them into the calendar with cal_id
+    using batched requests.  Events already imported from the same feed are updated through
+    their iCalUID instead of being added again.  Moved or changed occurrences of recurring
+    events (RECURRENCE-ID) can not be imported without the id the calendar gives to their
+    series, so files that have them are rejected before anything is sent
+    """
+    events = ics_feed.read_events_from_ics(file_path)
+    overrides = [uid for uid, recurrence_id in events if recurrence_id is not None]
+    if overrides:
+        raise ValueError("{} has {} changed occurrences of recurring events (RECURRENCE-ID), "
+                         "which can not be imported: {}".format(file_path, len(overrides), ', '.join(sorted(set(overrides)))))
+    gsuite.import_events_to_gcal_batch(events.values(), cal_service, cal_id)
+
 def main():
+    # check the sink first, the gcal sink deletes all the scheduled events before adding new ones
+    if EVENT_SINK not in EVENT_SINKS:
+        raise ValueError("EVENT_SINK must be one of {}, got {!r}".format(EVENT_SINKS, EVENT_SINK))
+    # set working dirctory
+    os.chdir(WORKING_DIR)
     # obtain credentials and read the events spreadsheet (always the same)
     credentials = gsuite.get_my_credentials()
     result = gsuite.get_events_gsheet_content(credentials, MAIN_EVENT_SHEET_ID)
@@ -119,10 +183,19 @@ def main():
         for tbl_ix in content_tbls_ix:
             tasks_dict=update_child_task_dict(tasks_dict, doc_content, tbl_ix,  key)
 
+    # google drive service is needed to add attachments to the events
+    drive_service = gsuite.build_gdrive_service(credentials)
+    # attachments read from the google drive during this run, by file id
+    drive_files = {}
+    if EVENT_SINK == 'ics':
+        # the feed is rewritten in full on every run, so there is nothing to delete first
+        all_events = itertools.chain(create_event_payloads(my_events_dict, drive_service, drive_files),
+                                     create_event_payloads(tasks_dict, drive_service, drive_files))
+        ics_feed.write_events_to_ics(all_events, ICS_FILE)
+        return
+
     # in order to schedule events we will need an instance of the calendar service
     cal_service = gsuite.build_gcal_service(credentials)
-    # as well as google drive service, needed to add attachments to the events
-    drive_service = gsuite.build_gdrive_service(credentials)
     # this application will be automated and run based on either a trigger or as a
     # scheduled event.  In order to start a fresh we will first need to delete the currently scheduled
     #events, this can be augmented by adding a tag to auto scheduled events, and only
@@ -131,10 +204,10 @@ def main():
 
     # schedule all Main Events stored in my_events_dict
     for k, i in my_events_dict.items():
-        schedule_event(i, drive_service, cal_service)
+        schedule_event(i, drive_service, cal_service, drive_files)
     #schedule Task Events stored in tasks_dict
     for k, i in tasks_dict.items():
-        schedule_event(i, drive_service, cal_service)
+        schedule_event(i, drive_service, cal_service, drive_files)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,135 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import gsuite
+
+def make_http_error(status, reason=None):
+    content = {'error': {'code': status, 'message': 'error'}}
+    if reason is not None:
+        content['error']['errors'] = [{'reason': reason}]
+    return HttpError(httplib2.Response({'status': status}), json.dumps(content).encode('utf-8'))
+
+class FakeRequest:
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+
+class FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def import_(self, **kwargs):
+        return FakeRequest(kwargs)
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            self.service.sent.append(request.kwargs)
+            exception = self.service.fail(request.kwargs['body'])
+            result = None if exception else {'htmlLink': 'link-' + request.kwargs['body']['iCalUID']}
+            self.callback(request_id, result, exception)
+
+class FakeCalService:
+    """Calendar service with events().import_() and new_batch_http_request(), fail(body)
+    returns the exception for a request or None when it succeeds"""
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda body: None)
+        self.sent = []
+        self.batch_sizes = []
+
+    def events(self):
+        return FakeEvents(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+def make_events(count):
+    return [{'iCalUID': 'uid-{}'.format(ix), 'summary': str(ix)} for ix in range(count)]
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(gsuite.time, 'sleep', calls.append)
+    return calls
+
+@pytest.mark.parametrize('batch_size', [0, -1, 51])
+def test_import_events_rejects_bad_batch_size(batch_size):
+    cal_service = FakeCalService()
+    with pytest.raises(ValueError):
+        gsuite.import_events_to_gcal_batch(make_events(1), cal_service, 'cal', batch_size=batch_size)
+    assert cal_service.sent == []
+
+def test_import_events_sends_batches(sleeps):
+    cal_service = FakeCalService()
+    events = make_events(120)
+    gsuite.import_events_to_gcal_batch(iter(events), cal_service, 'cal')
+    assert cal_service.batch_sizes == [50, 50, 20]
+    assert [request['body'] for request in cal_service.sent] == events
+    assert all(request['calendarId'] == 'cal' and request['supportsAttachments'] for request in cal_service.sent)
+    assert sleeps == []
+
+def test_import_events_resends_only_rate_limited_events(sleeps):
+    failures = {'uid-1': make_http_error(429), 'uid-3': make_http_error(403, 'rateLimitExceeded'),
+                'uid-4': make_http_error(503)}
+
+    def fail(body):
+        return failures.pop(body['iCalUID'], None)
+
+    cal_service = FakeCalService(fail)
+    gsuite.import_events_to_gcal_batch(make_events(5), cal_service, 'cal', batch_size=2)
+    resent = [request['body']['iCalUID'] for request in cal_service.sent[5:]]
+    assert resent == ['uid-1', 'uid-3', 'uid-4']
+    assert cal_service.batch_sizes == [2, 2, 1, 2, 1]
+    assert sleeps == [1]
+
+def test_import_events_raises_after_max_retries(sleeps):
+    cal_service = FakeCalService(lambda body: make_http_error(503))
+    with pytest.raises(HttpError) as err:
+        gsuite.import_events_to_gcal_batch(make_events(2), cal_service, 'cal', max_retries=3)
+    assert err.value.resp.status == 503
+    assert sleeps == [1, 2, 4]
+    assert len(cal_service.sent) == 8
+
+def test_import_events_does_not_retry_permanent_errors(sleeps):
+    forbidden = make_http_error(403, 'forbidden')
+
+    def fail(body):
+        if body['iCalUID'] == 'uid-0':
+            return make_http_error(429)
+        if body['iCalUID'] == 'uid-2':
+            return forbidden
+        return None
+
+    cal_service = FakeCalService(fail)
+    with pytest.raises(HttpError) as err:
+        gsuite.import_events_to_gcal_batch(make_events(3), cal_service, 'cal')
+    #the permanent error is raised, not the rate limit of the first event
+    assert err.value is forbidden
+    assert sleeps == []
+    assert len(cal_service.sent) == 3
+
+@pytest.mark.parametrize('err, retryable', [
+    (make_http_error(429), True),
+    (make_http_error(500), True),
+    (make_http_error(503), True),
+    (make_http_error(403, 'rateLimitExceeded'), True),
+    (make_http_error(403, 'userRateLimitExceeded'), True),
+    (make_http_error(403, 'forbidden'), False),
+    (make_http_error(403, 'requiredAccessLevel'), False),
+    (make_http_error(403), False),
+    (make_http_error(404), False),
+    (ValueError('not an http error'), False),
+])
+def test_is_retryable_gcal_error(err, retryable):
+    assert gsuite.is_retryable_gcal_error(err) is retryable
@@ -0,0 +1,192 @@
+import datetime
+
+import pytest
+
+import ics_feed
+
+#payload in the format built by gsuite.create_gcal_event_from_template
+TEMPLATE_EVENT = {
+    'summary': 'Summer Camp',
+    'description': 'Event: Pack tents; chairs, tables \ncomplete 7 days before the event Summer-Camp-230110',
+    'start': {
+    'dateTime': '2023-01-10T09:00:00-04:00',
+    'timeZone': 'America/New_York',
+    },
+    'end': {
+    'dateTime': '2023-01-10T17:00:00-04:00',
+    'timeZone': 'America/New_York',
+    },
+    'recurrence': [
+    'RRULE:FREQ=DAILY;COUNT=1'
+    ],
+    'attachments': [{
+    'fileUrl': 'https://docs.google.com/document/d/abc123/edit',
+    'mimeType': 'application/vnd.google-apps.document',
+    'title': 'Camp: packing list, v2'
+    }]
+}
+
+def write_ics(tmp_path, lines):
+    file_path = str(tmp_path / 'feed.ics')
+    with open(file_path, 'w', encoding='utf-8', newline='') as ics_file:
+        ics_file.write('\r\n'.join(lines) + '\r\n')
+    return file_path
+
+def to_utc(time_dict):
+    return datetime.datetime.fromisoformat(time_dict['dateTime'].replace('Z', '+00:00')).astimezone(datetime.timezone.utc)
+
+def test_fold_ics_line_splits_at_75_octets_without_breaking_characters():
+    line = 'DESCRIPTION:' + 'é' * 100
+    folded = ics_feed.fold_ics_line(line)
+    chunks = folded.split('\r\n')
+    assert all(len(chunk.encode('utf-8')) <= 75 for chunk in chunks)
+    assert len(chunks[0].encode('utf-8')) >= 74
+    assert all(chunk.startswith(' ') for chunk in chunks[1:])
+    assert list(ics_feed.unfold_ics_lines(iter(folded.split('\r\n')))) == [line]
+
+def test_fold_ics_line_leaves_short_lines_alone():
+    line = 'X' * 75
+    assert ics_feed.fold_ics_line(line) == line
+    assert ics_feed.fold_ics_line(line + 'Y') == line + '\r\n Y'
+
+def test_escape_ics_text_round_trip():
+    text = 'a\\b; c, d\ne'
+    escaped = ics_feed.escape_ics_text(text)
+    assert escaped == 'a\\\\b\\; c\\, d\\ne'
+    assert ics_feed.unescape_ics_text(escaped) == text
+
+def test_create_ics_uid_is_stable():
+    key = 'Pack tents  |  Summer-Camp-230110'
+    assert ics_feed.create_ics_uid(key) == ics_feed.create_ics_uid(key)
+    assert ics_feed.create_ics_uid(key) != ics_feed.create_ics_uid('Summer-Camp-230110')
+
+def test_export_then_read_back_matches_payload(tmp_path):
+    file_path = str(tmp_path / 'feed.ics')
+    key = 'Pack tents  |  Summer-Camp-230110'
+    assert ics_feed.write_events_to_ics(iter([(key, TEMPLATE_EVENT)]), file_path) == 1
+    events = ics_feed.read_events_from_ics(file_path)
+    uid = ics_feed.create_ics_uid(key)
+    cal_event = events[(uid, None)]
+    assert cal_event['iCalUID'] == uid
+    for field in ('summary', 'description', 'recurrence', 'attachments'):
+        assert cal_event[field] == TEMPLATE_EVENT[field]
+    #the -04:00 offset is kept, January 09:00-04:00 is 13:00 UTC
+    for side in ('start', 'end'):
+        assert to_utc(cal_event[side]) == to_utc(TEMPLATE_EVENT[side])
+    assert cal_event['start']['dateTime'] == '2023-01-10T13:00:00Z'
+
+def test_export_keeps_local_times_and_all_day_events(tmp_path):
+    file_path = str(tmp_path / 'feed.ics')
+    cal_event = {'summary': 'Local',
+                 'start': {'dateTime': '2023-01-10T09:00:00', 'timeZone': 'America/New_York'},
+                 'end': {'dateTime': '2023-01-10T17:00:00', 'timeZone': 'America/New_York'}}
+    all_day = {'summary': 'All day', 'start': {'date': '2023-01-10'}, 'end': {'date': '2023-01-11'}}
+    ics_feed.write_events_to_ics([('local', cal_event), ('all-day', all_day)], file_path)
+    with open(file_path, encoding='utf-8', newline='') as ics_file:
+        content = ics_file.read()
+    assert 'DTSTART;TZID=America/New_York:20230110T090000\r\n' in content
+    assert content.count('BEGIN:VTIMEZONE') == 1
+    assert 'DTSTART;VALUE=DATE:20230110\r\n' in content
+    events = ics_feed.read_events_from_ics(file_path)
+    assert events[(ics_feed.create_ics_uid('local'), None)]['start'] == cal_event['start']
+    assert events[(ics_feed.create_ics_uid('all-day'), None)]['end'] == all_day['end']
+
+def test_export_writes_time_zones_without_vtimezone_in_utc(tmp_path):
+    file_path = str(tmp_path / 'feed.ics')
+    cal_event = {'summary': 'London',
+                 'start': {'dateTime': '2023-07-10T09:00:00', 'timeZone': 'Europe/London'},
+                 'end': {'dateTime': '2023-07-10T17:00:00', 'timeZone': 'Europe/London'}}
+    ics_feed.write_events_to_ics([('london', cal_event)], file_path)
+    with open(file_path, encoding='utf-8', newline='') as ics_file:
+        content = ics_file.read()
+    assert 'TZID' not in content
+    assert 'DTSTART:20230710T080000Z\r\n' in content
+    cal_event['start']['timeZone'] = 'Nowhere/Unknown'
+    with pytest.raises(ValueError):
+        ics_feed.write_events_to_ics([('unknown', cal_event)], file_path)
+
+def test_write_events_to_ics_keeps_previous_feed_on_failure(tmp_path):
+    file_path = str(tmp_path / 'feed.ics')
+    ics_feed.write_events_to_ics([('first', TEMPLATE_EVENT)], file_path)
+    with open(file_path, encoding='utf-8') as ics_file:
+        previous = ics_file.read()
+
+    def failing_events():
+        yield 'second', TEMPLATE_EVENT
+        raise RuntimeError('drive lookup failed')
+
+    with pytest.raises(RuntimeError):
+        ics_feed.write_events_to_ics(failing_events(), file_path)
+    with open(file_path, encoding='utf-8') as ics_file:
+        assert ics_file.read() == previous
+    assert [path.name for path in tmp_path.iterdir()] == ['feed.ics']
+
+def test_read_events_without_uid_are_all_kept(tmp_path):
+    file_path = write_ics(tmp_path, [
+        'BEGIN:VCALENDAR',
+        'BEGIN:VEVENT', 'SUMMARY:one', 'DTSTART:20230110T130000Z', 'END:VEVENT',
+        'BEGIN:VEVENT', 'SUMMARY:two', 'DTSTART:20230110T130000Z', 'END:VEVENT',
+        'END:VCALENDAR'])
+    events = ics_feed.read_events_from_ics(file_path)
+    assert sorted(cal_event['summary'] for cal_event in events.values()) == ['one', 'two']
+    assert all(key == (cal_event['iCalUID'], None) for key, cal_event in events.items())
+    assert ics_feed.read_events_from_ics(file_path).keys() == events.keys()
+
+def test_read_events_ignores_alarm_properties(tmp_path):
+    file_path = write_ics(tmp_path, [
+        'BEGIN:VCALENDAR',
+        'BEGIN:VEVENT', 'UID:1', 'SUMMARY:Camp', 'DESCRIPTION:Real description',
+        'DTSTART:20230110T130000Z', 'DTEND:20230110T210000Z',
+        'BEGIN:VALARM', 'ACTION:DISPLAY', 'DESCRIPTION:Reminder', 'TRIGGER:-PT15M', 'END:VALARM',
+        'END:VEVENT',
+        'END:VCALENDAR'])
+    cal_event = ics_feed.read_events_from_ics(file_path)[('1', None)]
+    assert cal_event['description'] == 'Real description'
+    assert cal_event['end'] == {'dateTime': '2023-01-10T21:00:00Z', 'timeZone': 'UTC'}
+
+def test_read_events_handles_dates_and_durations(tmp_path):
+    file_path = write_ics(tmp_path, [
+        'BEGIN:VCALENDAR',
+        'BEGIN:VEVENT', 'UID:date', 'SUMMARY:All day', 'DTSTART;VALUE=DATE:20230101', 'END:VEVENT',
+        'BEGIN:VEVENT', 'UID:duration', 'SUMMARY:Meeting',
+        'DTSTART;TZID=America/New_York:20230101T230000', 'DURATION:PT1H30M', 'END:VEVENT',
+        'END:VCALENDAR'])
+    events = ics_feed.read_events_from_ics(file_path)
+    assert events[('date', None)]['start'] == {'date': '2023-01-01'}
+    assert events[('date', None)]['end'] == {'date': '2023-01-02'}
+    assert events[('duration', None)]['end'] == {'dateTime': '2023-01-02T00:30:00', 'timeZone': 'America/New_York'}
+
+def test_parse_ics_duration_rejects_invalid_values():
+    assert ics_feed.parse_ics_duration('P1W2D') == datetime.timedelta(days=9)
+    with pytest.raises(ValueError):
+        ics_feed.parse_ics_duration('PT')
+    with pytest.raises(ValueError):
+        ics_feed.parse_ics_duration('1 hour')
+
+def test_read_events_keeps_moved_occurrences_apart_from_their_series(tmp_path):
+    file_path = write_ics(tmp_path, [
+        'BEGIN:VCALENDAR',
+        'BEGIN:VEVENT', 'UID:a', 'SUMMARY:Weekly', 'DTSTART:20230110T130000Z',
+        'DTEND:20230110T140000Z', 'RRULE:FREQ=WEEKLY;COUNT=4', 'END:VEVENT',
+        'BEGIN:VEVENT', 'UID:a', 'SUMMARY:Moved', 'RECURRENCE-ID:20230117T130000Z',
+        'DTSTART:20230118T130000Z', 'DTEND:20230118T140000Z', 'END:VEVENT',
+        'END:VCALENDAR'])
+    events = ics_feed.read_events_from_ics(file_path)
+    assert sorted(events, key=str) == [('a', '20230117T130000Z'), ('a', None)]
+    assert events[('a', None)]['recurrence'] == ['RRULE:FREQ=WEEKLY;COUNT=4']
+    assert 'originalStartTime' not in events[('a', None)]
+    moved = events[('a', '20230117T130000Z')]
+    assert moved['summary'] == 'Moved'
+    assert moved['originalStartTime'] == {'dateTime': '2023-01-17T13:00:00Z', 'timeZone': 'UTC'}
+
+def test_create_ics_file_name_replaces_unsafe_characters():
+    assert ics_feed.create_ics_file_name('abc@group.calendar.google.com') == 'abc_group.calendar.google.com.ics'
+    assert ics_feed.create_ics_file_name('a/b c') == 'a_b_c.ics'
+
+def test_write_calendars_to_ics_writes_one_file_per_calendar(tmp_path):
+    calendars = {'first@group.calendar.google.com': [('one', TEMPLATE_EVENT)],
+                 'second@group.calendar.google.com': [('two', TEMPLATE_EVENT), ('three', TEMPLATE_EVENT)]}
+    file_paths = ics_feed.write_calendars_to_ics(calendars, str(tmp_path))
+    assert file_paths == {cal_id: str(tmp_path / ics_feed.create_ics_file_name(cal_id)) for cal_id in calendars}
+    assert len(ics_feed.read_events_from_ics(file_paths['first@group.calendar.google.com'])) == 1
+    assert len(ics_feed.read_events_from_ics(file_paths['second@group.calendar.google.com'])) == 2
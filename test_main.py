@@ -0,0 +1,91 @@
+import pytest
+
+import gsuite
+import ics_feed
+import main
+from event import MainEvent
+from event import EventTask
+from test_gsuite import FakeCalService
+
+class FakeFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, fileId):
+        self.service.file_ids.append(fileId)
+        return self
+
+    def execute(self):
+        file_id = self.service.file_ids[-1]
+        return {'alternateLink': 'https://docs.google.com/document/d/' + file_id + '/edit',
+                'mimeType': 'application/vnd.google-apps.document',
+                'title': 'Doc ' + file_id}
+
+class FakeDriveService:
+    def __init__(self):
+        self.file_ids = []
+
+    def files(self):
+        return FakeFiles(self)
+
+def test_create_event_payloads_reads_each_doc_once():
+    events_dict = {
+        'Summer-Camp-230110': MainEvent('Summer Camp', 'https://docs.google.com/document/d/camp/edit', '230110'),
+        'Pack tents  |  Summer-Camp-230110': EventTask('Pack tents', 'tents', '', 'Summer-Camp-230110', -1, 7),
+        'Buy food  |  Summer-Camp-230110': EventTask('Buy food', 'tents', '', 'Summer-Camp-230110', -1, 3),
+    }
+    drive_service = FakeDriveService()
+    drive_files = {}
+    payloads = dict(main.create_event_payloads(events_dict, drive_service, drive_files))
+    assert list(payloads) == list(events_dict)
+    assert drive_service.file_ids == ['camp', 'tents']
+    assert sorted(drive_files) == ['camp', 'tents']
+    tents = payloads['Pack tents  |  Summer-Camp-230110']
+    assert tents['summary'] == 'Pack tents'
+    assert tents['start']['dateTime'] == '2023-01-03T09:00:00-04:00'
+    assert tents['attachments'][0]['title'] == 'Doc tents'
+
+def test_create_event_payloads_without_cache_reads_every_doc():
+    events_dict = {
+        'a  |  Camp-230110': EventTask('a', 'tents', '', 'Camp-230110', -1, 7),
+        'b  |  Camp-230110': EventTask('b', 'tents', '', 'Camp-230110', -1, 3),
+    }
+    drive_service = FakeDriveService()
+    list(main.create_event_payloads(events_dict, drive_service))
+    assert drive_service.file_ids == ['tents', 'tents']
+
+def test_import_ics_to_gcal_sends_events_with_their_uids(tmp_path, monkeypatch):
+    monkeypatch.setattr(gsuite.time, 'sleep', lambda seconds: None)
+    file_path = str(tmp_path / 'feed.ics')
+    events_dict = {'Summer-Camp-230110': MainEvent('Summer Camp', 'https://docs.google.com/document/d/camp/edit', '230110')}
+    ics_feed.write_events_to_ics(main.create_event_payloads(events_dict, FakeDriveService()), file_path)
+    cal_service = FakeCalService()
+    main.import_ics_to_gcal(file_path, cal_service, 'cal')
+    assert [request['body']['iCalUID'] for request in cal_service.sent] == [ics_feed.create_ics_uid('Summer-Camp-230110')]
+    assert cal_service.sent[0]['body']['summary'] == 'Summer Camp'
+
+def test_import_ics_to_gcal_rejects_changed_occurrences(tmp_path):
+    file_path = str(tmp_path / 'feed.ics')
+    with open(file_path, 'w', encoding='utf-8', newline='') as ics_file:
+        ics_file.write('\r\n'.join([
+            'BEGIN:VCALENDAR',
+            'BEGIN:VEVENT', 'UID:a', 'SUMMARY:Weekly', 'DTSTART:20230110T130000Z',
+            'RRULE:FREQ=WEEKLY;COUNT=4', 'END:VEVENT',
+            'BEGIN:VEVENT', 'UID:a', 'SUMMARY:Moved', 'RECURRENCE-ID:20230117T130000Z',
+            'DTSTART:20230118T130000Z', 'END:VEVENT',
+            'END:VCALENDAR']) + '\r\n')
+    cal_service = FakeCalService()
+    with pytest.raises(ValueError):
+        main.import_ics_to_gcal(file_path, cal_service, 'cal')
+    assert cal_service.sent == []
+
+@pytest.mark.parametrize('sink', ['ICS', 'gcal ', ''])
+def test_main_rejects_unknown_event_sink(sink, monkeypatch):
+    def fail(*args):
+        raise AssertionError('main() went past the EVENT_SINK check')
+
+    monkeypatch.setattr(main, 'EVENT_SINK', sink)
+    monkeypatch.setattr(main.os, 'chdir', fail)
+    monkeypatch.setattr(gsuite, 'get_my_credentials', fail)
+    with pytest.raises(ValueError):
+        main.main()